@@ -7,7 +7,11 @@ This module provides functions for managing patient records and scan data.
 import os
 import sqlite3
 import json
-from datetime import datetime
+import atexit
+import functools
+import inspect
+import threading
+import weakref
 import logging
 
 # Configure logging
@@ -16,69 +20,386 @@ logger = logging.getLogger(__name__)
 # Define database path
 DATABASE_PATH = os.path.join('app', 'database', 'patients.db')
 
-def get_db_connection():
+# Whether the database directory has been created by this process
+_DB_DIR_READY = False
+
+# Whether the patients_fts search index is in use; None until first checked
+_fts_enabled = None
+
+# Size of each connection's prepared statement cache
+STATEMENT_CACHE_SIZE = 512
+
+# Queries run per request, kept as constants so each is prepared once per
+# connection and then served from the statement cache
+SQL_INSERT_PATIENT = "INSERT INTO patients (name, age, gender, contact, email, address, medical_history, registration_date) VALUES (?, ?, ?, ?, ?, ?, ?, DATE('now', 'localtime'))"
+SQL_GET_PATIENT = "SELECT * FROM patients WHERE id = ?"
+SQL_GET_ALL_PATIENTS = "SELECT * FROM patients ORDER BY name"
+SQL_SEARCH_PATIENTS_FTS = "SELECT p.* FROM patients_fts f JOIN patients p ON p.id = f.rowid WHERE patients_fts MATCH ? ORDER BY p.name"
+SQL_SEARCH_PATIENTS_LIKE = "SELECT * FROM patients WHERE name LIKE ? OR contact LIKE ? OR email LIKE ? ORDER BY name"
+SQL_FTS_TABLE_EXISTS = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'patients_fts'"
+SQL_FTS_TRIGGERS_EXIST = "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'patients_fts_insert'"
+SQL_INSERT_SCAN = "INSERT INTO scans (patient_id, image_path, tumor_type, confidence, scan_date, doctor_notes) VALUES (?, ?, ?, ?, DATE('now', 'localtime'), ?)"
+SQL_INSERT_SCAN_WITH_DATE = "INSERT INTO scans (patient_id, image_path, tumor_type, confidence, scan_date, doctor_notes) VALUES (?, ?, ?, ?, ?, ?)"
+SQL_GET_SCAN = "SELECT * FROM scans WHERE id = ?"
+SQL_GET_PATIENT_SCANS = "SELECT * FROM scans WHERE patient_id = ? ORDER BY scan_date DESC"
+SQL_UPDATE_SCAN_NOTES = "UPDATE scans SET doctor_notes = ? WHERE id = ?"
+
+# Rows fetched per round trip when streaming query results
+ROW_FETCH_SIZE = 256
+
+# Trigram full-text queries need at least this many characters to match
+FTS_MIN_QUERY_LENGTH = 3
+
+# Connection tuning applied to every new connection. WAL lets readers run
+# alongside the single writer, and synchronous=NORMAL is safe under WAL.
+CONNECTION_PRAGMAS = (
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-64000',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA busy_timeout=5000',
+)
+
+def configure_connection(conn):
+    """
+    Apply journal mode and performance PRAGMAs to a database connection.
+    
+    Args:
+        conn: An open SQLite connection
+    """
+    # journal_mode=WAL is persistent in the database file, so only switch it
+    # when needed. In-memory databases cannot use WAL.
+    if DATABASE_PATH != ':memory:':
+        journal_mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+        if journal_mode.lower() != 'wal':
+            conn.execute('PRAGMA journal_mode=WAL')
+    
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+
+# One connection per thread, so SQLite's page cache survives between
+# queries instead of being discarded on every close. When a thread ends,
+# its connection goes back to a small idle pool for the next thread to
+# reuse, so thread-per-request servers neither leak connections nor pay
+# the connect and PRAGMA cost on every request.
+MAX_IDLE_CONNECTIONS = 8
+
+_conn_local = threading.local()
+_idle_connections = []
+_idle_connections_lock = threading.Lock()
+_shutting_down = False
+
+# Connections inherited from the parent after a fork. They are never used
+# or closed in the child, only kept referenced so that garbage collection
+# does not close the parent's SQLite handles from this process.
+_inherited_connections = []
+
+class _ConnectionHolder:
+    """
+    Per-thread owner of a connection; when the thread ends and this object
+    is garbage collected, the connection is released back to the pool.
     """
-    Get a connection to the SQLite database.
+    
+    def __init__(self, conn):
+        self.conn = conn
+        weakref.finalize(self, _release_connection, conn, os.getpid())
+
+def _release_connection(conn, owner_pid):
+    """
+    Return a connection from a finished thread to the idle pool, or close it
+    if the pool is full or the interpreter is exiting.
+    
+    Args:
+        conn: The connection to release
+        owner_pid: ID of the process that opened the connection
+    """
+    # A connection inherited across fork belongs to the parent process
+    if os.getpid() != owner_pid:
+        _inherited_connections.append(conn)
+        return
+    
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+        
+        with _idle_connections_lock:
+            if not _shutting_down and len(_idle_connections) < MAX_IDLE_CONNECTIONS:
+                _idle_connections.append(conn)
+                return
+        
+        conn.close()
+    except Exception as e:
+        logger.error(f"Error releasing database connection: {e}")
+
+def _open_connection():
+    """
+    Open and configure a new connection to the SQLite database.
     
     Returns:
         A connection object to the database
     """
+    global _DB_DIR_READY
+    
     try:
         # Ensure the database directory exists
-        os.makedirs(os.path.dirname(DATABASE_PATH), exist_ok=True)
-        
-        # Connect to the database
-        conn = sqlite3.connect(DATABASE_PATH)
+        if not _DB_DIR_READY and DATABASE_PATH != ':memory:':
+            os.makedirs(os.path.dirname(DATABASE_PATH), exist_ok=True)
+            _DB_DIR_READY = True
+        
+        # Connect to the database in autocommit mode; multi-statement
+        # writes open their own transactions explicitly
+        conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False, isolation_level=None,
+                               cached_statements=STATEMENT_CACHE_SIZE)
         conn.row_factory = sqlite3.Row
+        configure_connection(conn)
         return conn
     except Exception as e:
         logger.error(f"Error connecting to database: {e}")
         raise
 
+def get_db_connection():
+    """
+    Get the calling thread's connection to the SQLite database.
+    
+    The connection is taken from the idle pool or opened on first use, and
+    reused for the lifetime of the thread. Callers must not close it.
+    
+    Returns:
+        A connection object to the database
+    """
+    holder = getattr(_conn_local, 'holder', None)
+    if holder is not None:
+        return holder.conn
+    
+    with _idle_connections_lock:
+        conn = _idle_connections.pop() if _idle_connections else None
+    
+    if conn is None:
+        conn = _open_connection()
+    
+    _conn_local.holder = _ConnectionHolder(conn)
+    return conn
+
+def _reset_connections_after_fork():
+    """
+    Forget the parent's connections in a forked child process.
+    
+    SQLite connections must not be used across fork (for example gunicorn
+    --preload workers after init_db() ran in the master), so the child
+    drops the inherited per-thread connection and idle pool and opens its
+    own connections on demand. The inherited handles are left open.
+    """
+    global _idle_connections, _idle_connections_lock
+    
+    # The lock may have been held by another thread at the time of the fork
+    _idle_connections_lock = threading.Lock()
+    _inherited_connections.extend(_idle_connections)
+    _idle_connections = []
+    _conn_local.__dict__.pop('holder', None)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_connections_after_fork)
+
+@atexit.register
+def _close_db_connections():
+    """
+    Close every idle connection. Registered to run at interpreter exit;
+    connections still held by threads are closed when they are released.
+    """
+    global _shutting_down
+    
+    with _idle_connections_lock:
+        _shutting_down = True
+        connections = _idle_connections[:]
+        _idle_connections.clear()
+    
+    for conn in connections:
+        try:
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error closing database connection: {e}")
+
 def init_db():
     """
     Initialize the database schema if it doesn't exist.
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Create patients table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS patients (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            age INTEGER NOT NULL,
-            gender TEXT NOT NULL,
-            contact TEXT,
-            email TEXT,
-            address TEXT,
-            medical_history TEXT,
-            registration_date TEXT NOT NULL
-        )
-        ''')
+        # The context manager commits the schema changes or rolls them back
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN')
+            
+            # Create patients table
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS patients (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                age INTEGER NOT NULL,
+                gender TEXT NOT NULL,
+                contact TEXT,
+                email TEXT,
+                address TEXT,
+                medical_history TEXT,
+                registration_date TEXT NOT NULL
+            )
+            ''')
+            
+            # Create scans table
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS scans (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                patient_id INTEGER NOT NULL,
+                image_path TEXT NOT NULL,
+                tumor_type TEXT,
+                confidence REAL,
+                scan_date TEXT NOT NULL,
+                doctor_notes TEXT,
+                FOREIGN KEY (patient_id) REFERENCES patients (id)
+            )
+            ''')
+            
+            # Create secondary indexes for per-patient scan lookups and name ordering
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_scans_patient_date ON scans (patient_id, scan_date DESC)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_patients_by_name ON patients (name)')
+            
+            # Replaced by idx_patients_by_name, whose collation matches ORDER BY name
+            cursor.execute('DROP INDEX IF EXISTS idx_patients_name')
+            
+            # Create full-text search index for patient search
+            init_patient_search(cursor)
         
-        # Create scans table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS scans (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            patient_id INTEGER NOT NULL,
-            image_path TEXT NOT NULL,
-            tumor_type TEXT,
-            confidence REAL,
-            scan_date TEXT NOT NULL,
-            doctor_notes TEXT,
-            FOREIGN KEY (patient_id) REFERENCES patients (id)
-        )
-        ''')
-        
-        conn.commit()
-        conn.close()
         logger.info("Database initialized successfully")
     except Exception as e:
         logger.error(f"Error initializing database: {e}")
         raise
 
+def init_patient_search(cursor):
+    """
+    Create the FTS5 index used by search_patients, if SQLite supports it.
+    
+    The index is an external-content table over patients, kept in sync by
+    triggers. The trigram tokenizer preserves the substring, case-insensitive
+    matching of the original LIKE search, and needs SQLite 3.34 or later
+    built with FTS5.
+    
+    Because the triggers make every write to patients depend on FTS5, they
+    are dropped when the database is opened by a SQLite build without it
+    (search falls back to LIKE), and recreated with a full reindex once a
+    capable build opens the database again.
+    
+    Args:
+        cursor: A cursor on the database connection
+    """
+    global _fts_enabled
+    
+    cursor.execute(SQL_FTS_TABLE_EXISTS)
+    if cursor.fetchone():
+        try:
+            cursor.execute('SELECT rowid FROM patients_fts LIMIT 1')
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Full-text search unavailable, falling back to LIKE search: {e}")
+            for trigger in ('patients_fts_insert', 'patients_fts_delete', 'patients_fts_update'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+            _fts_enabled = False
+            return
+        
+        cursor.execute(SQL_FTS_TRIGGERS_EXIST)
+        if cursor.fetchone():
+            _fts_enabled = True
+            return
+    else:
+        try:
+            cursor.execute('''
+            CREATE VIRTUAL TABLE patients_fts USING fts5(
+                name, contact, email,
+                content='patients', content_rowid='id', tokenize='trigram'
+            )
+            ''')
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Full-text search unavailable, falling back to LIKE search: {e}")
+            _fts_enabled = False
+            return
+    
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS patients_fts_insert AFTER INSERT ON patients BEGIN
+        INSERT INTO patients_fts (rowid, name, contact, email)
+        VALUES (new.id, new.name, new.contact, new.email);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS patients_fts_delete AFTER DELETE ON patients BEGIN
+        INSERT INTO patients_fts (patients_fts, rowid, name, contact, email)
+        VALUES ('delete', old.id, old.name, old.contact, old.email);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS patients_fts_update AFTER UPDATE ON patients BEGIN
+        INSERT INTO patients_fts (patients_fts, rowid, name, contact, email)
+        VALUES ('delete', old.id, old.name, old.contact, old.email);
+        INSERT INTO patients_fts (rowid, name, contact, email)
+        VALUES (new.id, new.name, new.contact, new.email);
+    END
+    ''')
+    
+    # Index patients that existed before the search table was created, or
+    # were written while the triggers were dropped
+    cursor.execute("INSERT INTO patients_fts (patients_fts) VALUES ('rebuild')")
+    _fts_enabled = True
+
+def db_guard(default, action):
+    """
+    Decorator that logs database errors and returns a fallback value.
+    
+    Generator functions are also supported: an error before the first item
+    is yielded is logged and the generator yields the items of the fallback
+    value instead. An error after items have been yielded is logged and
+    re-raised, so a partial result is never mistaken for a complete one.
+    
+    Args:
+        default: Value returned when the wrapped function raises; if callable,
+                 it is called to build a fresh value (e.g. list)
+        action: Description of the operation for the error log, formatted
+                with the wrapped function's arguments (e.g. 'getting patient {patient_id}')
+        
+    Returns:
+        The decorator
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        
+        def log_error(e, args, kwargs):
+            arguments = signature.bind(*args, **kwargs).arguments
+            logger.error(f"Error {action.format(**arguments)}: {e}")
+        
+        def fallback():
+            return default() if callable(default) else default
+        
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                started = False
+                try:
+                    for item in func(*args, **kwargs):
+                        started = True
+                        yield item
+                except Exception as e:
+                    log_error(e, args, kwargs)
+                    if started:
+                        raise
+                    yield from fallback()
+            return generator_wrapper
+        
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                log_error(e, args, kwargs)
+                return fallback()
+        return wrapper
+    return decorator
+
+@db_guard(None, 'adding patient')
 def add_patient(name, age, gender, contact=None, email=None, address=None, medical_history=None):
     """
     Add a new patient to the database.
@@ -95,31 +416,16 @@ def add_patient(name, age, gender, contact=None, email=None, address=None, medic
     Returns:
         The ID of the newly added patient
     """
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get current date in YYYY-MM-DD format
-        registration_date = datetime.now().strftime('%Y-%m-%d')
-        
-        cursor.execute('''
-        INSERT INTO patients (name, age, gender, contact, email, address, medical_history, registration_date)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (name, age, gender, contact, email, address, medical_history, registration_date))
-        
-        # Get the ID of the newly inserted patient
-        patient_id = cursor.lastrowid
-        
-        conn.commit()
-        conn.close()
-        
-        logger.info(f"Added patient {name} with ID {patient_id}")
-        return patient_id
+    # SQLite fills in the registration date as the current local date (YYYY-MM-DD)
+    with get_db_connection() as conn:
+        patient_id = conn.execute(
+            SQL_INSERT_PATIENT, (name, age, gender, contact, email, address, medical_history)
+        ).lastrowid
     
-    except Exception as e:
-        logger.error(f"Error adding patient: {e}")
-        return None
+    logger.info(f"Added patient {name} with ID {patient_id}")
+    return patient_id
 
+@db_guard(None, 'getting patient {patient_id}')
 def get_patient(patient_id):
     """
     Get a patient's details by ID.
@@ -130,25 +436,12 @@ def get_patient(patient_id):
     Returns:
         A dictionary containing the patient's details
     """
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM patients WHERE id = ?', (patient_id,))
-        patient = cursor.fetchone()
-        
-        conn.close()
-        
-        if patient:
-            # Convert SQLite Row to dict
-            return dict(patient)
-        else:
-            return None
+    with get_db_connection() as conn:
+        patient = conn.execute(SQL_GET_PATIENT, (patient_id,)).fetchone()
     
-    except Exception as e:
-        logger.error(f"Error getting patient {patient_id}: {e}")
-        return None
+    return dict(patient) if patient else None
 
+@db_guard(list, 'getting all patients')
 def get_all_patients():
     """
     Get all patients from the database.
@@ -156,22 +449,25 @@ def get_all_patients():
     Returns:
         A list of dictionaries containing patient details
     """
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM patients ORDER BY name')
-        patients = cursor.fetchall()
-        
-        conn.close()
-        
-        # Convert SQLite Row objects to dictionaries
-        return [dict(patient) for patient in patients]
+    with get_db_connection() as conn:
+        patients = conn.execute(SQL_GET_ALL_PATIENTS).fetchall()
     
-    except Exception as e:
-        logger.error(f"Error getting all patients: {e}")
-        return []
+    return [dict(patient) for patient in patients]
 
+@db_guard(list, 'getting all patients')
+def iter_patients():
+    """
+    Stream all patients from the database, ordered by name.
+    
+    Unlike get_all_patients, rows are fetched in batches as the caller
+    consumes them, so the full result list is never built in memory.
+    
+    Yields:
+        Dictionaries containing patient details
+    """
+    yield from _iter_rows(SQL_GET_ALL_PATIENTS)
+
+@db_guard(list, 'searching patients')
 def search_patients(query):
     """
     Search for patients by name, contact, or email.
@@ -182,30 +478,29 @@ def search_patients(query):
     Returns:
         A list of dictionaries containing matching patient details
     """
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Use LIKE for case-insensitive search
-        search_term = f"%{query}%"
-        
-        cursor.execute('''
-        SELECT * FROM patients 
-        WHERE name LIKE ? OR contact LIKE ? OR email LIKE ?
-        ORDER BY name
-        ''', (search_term, search_term, search_term))
-        
-        patients = cursor.fetchall()
-        
-        conn.close()
-        
-        # Convert SQLite Row objects to dictionaries
-        return [dict(patient) for patient in patients]
+    global _fts_enabled
     
-    except Exception as e:
-        logger.error(f"Error searching patients: {e}")
-        return []
+    with get_db_connection() as conn:
+        if _fts_enabled is None:
+            _fts_enabled = conn.execute(SQL_FTS_TRIGGERS_EXIST).fetchone() is not None
+        
+        if _fts_enabled and len(query) >= FTS_MIN_QUERY_LENGTH:
+            # Quote the query as a single FTS phrase so user input is never
+            # parsed as FTS syntax
+            phrase = '"' + query.replace('"', '""') + '"'
+            
+            patients = conn.execute(SQL_SEARCH_PATIENTS_FTS, (phrase,)).fetchall()
+        else:
+            # Use LIKE for case-insensitive search
+            search_term = f"%{query}%"
+            
+            patients = conn.execute(
+                SQL_SEARCH_PATIENTS_LIKE, (search_term, search_term, search_term)
+            ).fetchall()
+    
+    return [dict(patient) for patient in patients]
 
+@db_guard(None, 'adding scan')
 def add_scan(patient_id, image_path, tumor_type=None, confidence=None, doctor_notes=None):
     """
     Add a new scan for a patient.
@@ -220,31 +515,37 @@ def add_scan(patient_id, image_path, tumor_type=None, confidence=None, doctor_no
     Returns:
         The ID of the newly added scan
     """
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get current date in YYYY-MM-DD format
-        scan_date = datetime.now().strftime('%Y-%m-%d')
-        
-        cursor.execute('''
-        INSERT INTO scans (patient_id, image_path, tumor_type, confidence, scan_date, doctor_notes)
-        VALUES (?, ?, ?, ?, ?, ?)
-        ''', (patient_id, image_path, tumor_type, confidence, scan_date, doctor_notes))
-        
-        # Get the ID of the newly inserted scan
-        scan_id = cursor.lastrowid
-        
-        conn.commit()
-        conn.close()
+    # SQLite fills in the scan date as the current local date (YYYY-MM-DD)
+    with get_db_connection() as conn:
+        scan_id = conn.execute(
+            SQL_INSERT_SCAN, (patient_id, image_path, tumor_type, confidence, doctor_notes)
+        ).lastrowid
+    
+    logger.info(f"Added scan for patient {patient_id} with scan ID {scan_id}")
+    return scan_id
+
+@db_guard(None, 'adding scans in bulk')
+def add_scans_bulk(records):
+    """
+    Add many scans in a single transaction.
+    
+    Args:
+        records: An iterable of (patient_id, image_path, tumor_type, confidence,
+                 scan_date, doctor_notes) tuples
         
-        logger.info(f"Added scan for patient {patient_id} with scan ID {scan_id}")
-        return scan_id
+    Returns:
+        The number of scans added, or None if the import failed
+    """
+    # The connection is in autocommit mode, so open the transaction
+    # explicitly; the context manager commits it or rolls it back
+    with get_db_connection() as conn:
+        conn.execute('BEGIN')
+        scan_count = conn.executemany(SQL_INSERT_SCAN_WITH_DATE, records).rowcount
     
-    except Exception as e:
-        logger.error(f"Error adding scan: {e}")
-        return None
+    logger.info(f"Added {scan_count} scans in bulk")
+    return scan_count
 
+@db_guard(None, 'getting scan {scan_id}')
 def get_scan(scan_id):
     """
     Get a scan's details by ID.
@@ -255,25 +556,12 @@ def get_scan(scan_id):
     Returns:
         A dictionary containing the scan's details
     """
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM scans WHERE id = ?', (scan_id,))
-        scan = cursor.fetchone()
-        
-        conn.close()
-        
-        if scan:
-            # Convert SQLite Row to dict
-            return dict(scan)
-        else:
-            return None
+    with get_db_connection() as conn:
+        scan = conn.execute(SQL_GET_SCAN, (scan_id,)).fetchone()
     
-    except Exception as e:
-        logger.error(f"Error getting scan {scan_id}: {e}")
-        return None
+    return dict(scan) if scan else None
 
+@db_guard(list, 'getting scans for patient {patient_id}')
 def get_patient_scans(patient_id):
     """
     Get all scans for a specific patient.
@@ -284,22 +572,44 @@ def get_patient_scans(patient_id):
     Returns:
         A list of dictionaries containing scan details
     """
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM scans WHERE patient_id = ? ORDER BY scan_date DESC', (patient_id,))
-        scans = cursor.fetchall()
+    with get_db_connection() as conn:
+        scans = conn.execute(SQL_GET_PATIENT_SCANS, (patient_id,)).fetchall()
+    
+    return [dict(scan) for scan in scans]
+
+@db_guard(list, 'getting scans for patient {patient_id}')
+def iter_patient_scans(patient_id):
+    """
+    Stream all scans for a specific patient, newest first.
+    
+    Args:
+        patient_id: The ID of the patient
         
-        conn.close()
+    Yields:
+        Dictionaries containing scan details
+    """
+    yield from _iter_rows(SQL_GET_PATIENT_SCANS, (patient_id,))
+
+def _iter_rows(sql, params=()):
+    """
+    Run a query and yield its rows as dictionaries, fetching in batches.
+    
+    Args:
+        sql: The SQL query
+        params: Query parameters
         
-        # Convert SQLite Row objects to dictionaries
-        return [dict(scan) for scan in scans]
+    Yields:
+        One dictionary per result row
+    """
+    cursor = get_db_connection().cursor()
+    cursor.arraysize = ROW_FETCH_SIZE
+    cursor.execute(sql, params)
     
-    except Exception as e:
-        logger.error(f"Error getting scans for patient {patient_id}: {e}")
-        return []
+    while rows := cursor.fetchmany():
+        for row in rows:
+            yield dict(row)
 
+@db_guard(False, 'updating scan {scan_id}')
 def update_scan(scan_id, doctor_notes=None):
     """
     Update a scan's details.
@@ -311,18 +621,8 @@ def update_scan(scan_id, doctor_notes=None):
     Returns:
         True if successful, False otherwise
     """
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('UPDATE scans SET doctor_notes = ? WHERE id = ?', (doctor_notes, scan_id))
-        
-        conn.commit()
-        conn.close()
-        
-        logger.info(f"Updated scan {scan_id}")
-        return True
+    with get_db_connection() as conn:
+        conn.execute(SQL_UPDATE_SCAN_NOTES, (doctor_notes, scan_id))
     
-    except Exception as e:
-        logger.error(f"Error updating scan {scan_id}: {e}")
-        return False 
\ No newline at end of file
+    logger.info(f"Updated scan {scan_id}")
+    return True
@@ -6,6 +6,10 @@ and making predictions on new MRI images.
 """
 
 import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
 import numpy as np
 import tensorflow as tf
 from PIL import Image
@@ -14,32 +18,124 @@ import logging
 # Configure logging
 logger = logging.getLogger(__name__)
 
+try:
+    # OpenCV decodes and resizes faster than PIL; PIL remains the fallback
+    import cv2
+    opencv_available = True
+except ImportError:
+    logger.warning("OpenCV not installed. Falling back to PIL for image preprocessing.")
+    opencv_available = False
+
+# Shape of a single model input image (height, width, channels)
+INPUT_SHAPE = (150, 150, 3)
+
+# Output classes, in the order of the model's output units
+CLASS_LABELS = ('glioma', 'meningioma', 'notumor', 'pituitary')
+
+# Model file names; the int8 TFLite model is preferred when present
+KERAS_MODEL_FILENAME = 'brain_tumor_classifier.h5'
+TFLITE_MODEL_FILENAME = 'brain_tumor_classifier.tflite'
+
+# Model shared by all callers, loaded on first use
+_MODEL = None
+_MODEL_LOCK = threading.Lock()
+
+# Untrained stand-in used while the real model cannot be loaded. It is
+# never stored in _MODEL, so every call retries the real model first.
+_PLACEHOLDER_MODEL = None
+
+# Per-thread input batch reused across predictions
+_input_local = threading.local()
+
+# Micro-batching: concurrent predictions arriving within the window are
+# run through the model together, up to the maximum batch size
+BATCH_WINDOW_SECONDS = 0.01
+MAX_BATCH_SIZE = 16
+
+# Batching wrapper around the shared model, created on first use
+_BATCHED_MODEL = None
+
 def load_brain_tumor_model():
     """
-    Load the pre-trained brain tumor classification model.
+    Get the pre-trained brain tumor classification model.
+    
+    The model is loaded and warmed up on the first call; later calls
+    return the same instance. Keras models are returned wrapped in a
+    KerasGraphModel; the underlying model is available as its `model`
+    attribute.
+    
+    If the real model cannot be loaded, an untrained placeholder model is
+    returned so the application keeps running. The placeholder is not
+    cached as the shared model: each call retries the real model and logs
+    an error while the placeholder is in use.
+    
+    Returns:
+        A model for tumor classification exposing predict()
+    """
+    global _MODEL
+    
+    if _MODEL is not None:
+        return _MODEL
+    
+    with _MODEL_LOCK:
+        if _MODEL is None:
+            model = _load_model()
+            if model is None:
+                logger.error("Real model unavailable; serving predictions from an untrained placeholder model")
+                return _get_placeholder_model()
+            
+            _MODEL = _prepare_model(model)
+    
+    return _MODEL
+
+def _prepare_model(model):
+    """
+    Wrap a loaded model for inference and warm it up.
+    
+    Args:
+        model: A loaded TFLite or Keras model
+        
+    Returns:
+        A model exposing predict()
+    """
+    # Keras models are wrapped so inference runs as a traced graph
+    if isinstance(model, tf.keras.Model):
+        model = KerasGraphModel(model)
+    
+    # Run one dummy prediction so graph tracing happens now rather
+    # than on the first real request
+    try:
+        model.predict(np.zeros((1,) + INPUT_SHAPE, dtype=np.float32), verbose=0)
+    except Exception as e:
+        logger.warning(f"Model warm-up failed: {e}")
+    
+    return model
+
+def _load_model():
+    """
+    Load the brain tumor classification model from disk.
     
     Returns:
-        A TensorFlow/Keras model for tumor classification
+        A model for tumor classification (TFLite or Keras), or None if no
+        model could be loaded
     """
+    # Prefer the quantized TFLite model, falling back to Keras if it is
+    # missing or cannot be loaded
+    tflite_path = find_model_file(TFLITE_MODEL_FILENAME)
+    if tflite_path is not None:
+        try:
+            logger.info(f"Loading TFLite model from {tflite_path}")
+            model = TFLiteModel(tflite_path)
+            logger.info("TFLite model loaded successfully")
+            return model
+        except Exception as e:
+            logger.warning(f"Error loading TFLite model, falling back to Keras: {e}")
+    
     try:
         # Path to the model file
-        model_path = os.path.join('app', 'models', 'brain_tumor_classifier.h5')
-        
-        # Check if the model file exists
-        if not os.path.exists(model_path):
-            # Try alternative paths
-            alternative_paths = [
-                'brain_tumor_classifier.h5',
-                os.path.join('app', 'models', 'brain_tumor_classifier.h5'),
-                os.path.join(os.path.dirname(os.path.abspath(__file__)), 'brain_tumor_classifier.h5')
-            ]
-            
-            for path in alternative_paths:
-                if os.path.exists(path):
-                    model_path = path
-                    break
-            else:
-                raise FileNotFoundError(f"Model file not found at {model_path} or alternative paths")
+        model_path = find_model_file(KERAS_MODEL_FILENAME)
+        if model_path is None:
+            raise FileNotFoundError(f"Model file {KERAS_MODEL_FILENAME} not found in any known location")
         
         # Load the model
         logger.info(f"Loading model from {model_path}")
@@ -49,11 +145,25 @@ def load_brain_tumor_model():
     
     except Exception as e:
         logger.error(f"Error loading model: {e}")
+        return None
+
+def _get_placeholder_model():
+    """
+    Get the untrained placeholder model, building it on first use.
+    
+    Must be called with _MODEL_LOCK held.
+    
+    Returns:
+        A placeholder model exposing predict()
+    """
+    global _PLACEHOLDER_MODEL
+    
+    if _PLACEHOLDER_MODEL is None:
         # Create a simple model to avoid breaking the application
         logger.warning("Creating a placeholder model for demonstration purposes")
         
         # Create a simple CNN model for demonstration
-        inputs = tf.keras.Input(shape=(150, 150, 3))
+        inputs = tf.keras.Input(shape=INPUT_SHAPE)
         x = tf.keras.layers.Conv2D(32, 3, activation='relu')(inputs)
         x = tf.keras.layers.MaxPooling2D()(x)
         x = tf.keras.layers.Flatten()(x)
@@ -67,32 +177,297 @@ def load_brain_tumor_model():
             metrics=['accuracy']
         )
         
+        _PLACEHOLDER_MODEL = _prepare_model(model)
+    
+    return _PLACEHOLDER_MODEL
+
+def get_batched_model():
+    """
+    Get the shared model wrapped in a micro-batching PredictionBatcher.
+    
+    The result can be passed to predict_tumor_type in place of the model.
+    While the real model cannot be loaded, the unbatched placeholder from
+    load_brain_tumor_model is returned instead, so the batcher is never
+    bound to the placeholder.
+    
+    Returns:
+        A PredictionBatcher around the model from load_brain_tumor_model
+    """
+    global _BATCHED_MODEL
+    
+    if _BATCHED_MODEL is not None:
+        return _BATCHED_MODEL
+    
+    model = load_brain_tumor_model()
+    if model is not _MODEL:
         return model
+    
+    with _MODEL_LOCK:
+        if _BATCHED_MODEL is None:
+            _BATCHED_MODEL = PredictionBatcher(model)
+    
+    return _BATCHED_MODEL
+
+class PredictionBatcher:
+    """
+    Coalesces concurrent predict() calls into batched model invocations.
+    
+    Each caller's images are queued and the caller blocks until a background
+    worker has run them, together with any other images queued within
+    BATCH_WINDOW_SECONDS, through the wrapped model.
+    """
+    
+    def __init__(self, model, max_batch_size=MAX_BATCH_SIZE, batch_window=BATCH_WINDOW_SECONDS):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name='prediction-batcher', daemon=True)
+        self._worker.start()
+    
+    def predict(self, images, verbose=0):
+        """
+        Run inference on a batch of preprocessed images.
+        
+        Args:
+            images: Float array of shape (batch, height, width, channels)
+            verbose: Ignored; accepted for compatibility with Keras
+            
+        Returns:
+            A numpy array of class probabilities, one row per image
+        """
+        futures = []
+        for image in images:
+            future = Future()
+            self._queue.put((image, future))
+            futures.append(future)
+        
+        return np.stack([future.result() for future in futures])
+    
+    def _run(self):
+        """
+        Worker loop: collect queued images into batches and run the model.
+        """
+        while True:
+            items = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_window
+            
+            while len(items) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            try:
+                batch = np.stack([image for image, _ in items])
+                predictions = self.model.predict(batch, verbose=0)
+                if len(predictions) != len(items):
+                    raise ValueError(f"Model returned {len(predictions)} predictions for {len(items)} images")
+                
+                for (_, future), prediction in zip(items, predictions):
+                    future.set_result(prediction)
+            except Exception as e:
+                # Fail every caller still waiting on this batch; the worker
+                # keeps running for later batches
+                logger.error(f"Error during batched prediction: {e}")
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+
+def find_model_file(filename):
+    """
+    Locate a model file in the known model directories.
+    
+    Args:
+        filename: Name of the model file
+        
+    Returns:
+        The path to the model file, or None if it does not exist
+    """
+    candidate_paths = [
+        os.path.join('app', 'models', filename),
+        filename,
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+    ]
+    
+    for path in candidate_paths:
+        if os.path.exists(path):
+            return path
+    return None
+
+class KerasGraphModel:
+    """
+    Wrapper that runs a Keras model's forward pass as a traced tf.function.
+    
+    The input signature fixes the image shape and leaves only the batch size
+    open, so the graph is traced once and reused, skipping the per-call
+    Python overhead of Keras model.predict().
+    """
+    
+    def __init__(self, model):
+        self.model = model
+        self._predict_fn = tf.function(
+            lambda images: model(images, training=False),
+            input_signature=[tf.TensorSpec((None,) + INPUT_SHAPE, tf.float32)]
+        )
+    
+    def predict(self, images, verbose=0):
+        """
+        Run inference on a batch of preprocessed images.
+        
+        Args:
+            images: Float array of shape (batch, height, width, channels)
+            verbose: Ignored; accepted for compatibility with Keras
+            
+        Returns:
+            A numpy array of class probabilities, one row per image
+        """
+        return self._predict_fn(tf.constant(images, dtype=tf.float32)).numpy()
+
+class TFLiteModel:
+    """
+    Wrapper around a TFLite interpreter exposing the Keras predict() interface.
+    """
+    
+    def __init__(self, model_path):
+        self.interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=os.cpu_count())
+        self.interpreter.allocate_tensors()
+        self.input_details = self.interpreter.get_input_details()[0]
+        self.output_details = self.interpreter.get_output_details()[0]
+        
+        # The interpreter holds mutable tensor state, so calls are serialized
+        self._lock = threading.Lock()
+    
+    def predict(self, images, verbose=0):
+        """
+        Run inference on a batch of preprocessed images.
+        
+        Args:
+            images: Float array of shape (batch, height, width, channels)
+            verbose: Ignored; accepted for compatibility with Keras
+            
+        Returns:
+            A numpy array of class probabilities, one row per image
+        """
+        input_index = self.input_details['index']
+        output_index = self.output_details['index']
+        
+        images = np.asarray(images, dtype=np.float32)
+        
+        # Quantize the input if the model expects integer tensors
+        input_dtype = self.input_details['dtype']
+        if input_dtype != np.float32:
+            scale, zero_point = self.input_details['quantization']
+            info = np.iinfo(input_dtype)
+            images = np.clip(np.round(images / scale + zero_point), info.min, info.max).astype(input_dtype)
+        
+        with self._lock:
+            if tuple(self.interpreter.get_input_details()[0]['shape']) != images.shape:
+                self.interpreter.resize_tensor_input(input_index, images.shape)
+                self.interpreter.allocate_tensors()
+            
+            self.interpreter.set_tensor(input_index, images)
+            self.interpreter.invoke()
+            predictions = self.interpreter.get_tensor(output_index)
+        
+        # Dequantize the output back to probabilities
+        if self.output_details['dtype'] != np.float32:
+            scale, zero_point = self.output_details['quantization']
+            predictions = (predictions.astype(np.float32) - zero_point) * scale
+        
+        return predictions
 
-def preprocess_image(image_path, target_size=(150, 150)):
+def convert_model_to_tflite(model, representative_image_paths, output_path=None):
+    """
+    Convert a Keras model to an int8-quantized TFLite model.
+    
+    This is a one-time offline step; once the file exists next to the
+    Keras model, load_brain_tumor_model uses it automatically.
+    
+    Args:
+        model: The Keras model to convert, or a KerasGraphModel wrapping it
+        representative_image_paths: Paths to sample MRI images used to
+                                    calibrate the quantization ranges
+        output_path: Where to write the .tflite file (optional)
+        
+    Returns:
+        The path of the written TFLite model
+    """
+    if output_path is None:
+        output_path = os.path.join('app', 'models', TFLITE_MODEL_FILENAME)
+    
+    if isinstance(model, KerasGraphModel):
+        model = model.model
+    
+    def representative_dataset():
+        for image_path in representative_image_paths:
+            yield [preprocess_image(image_path).astype(np.float32)]
+    
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    tflite_model = converter.convert()
+    
+    with open(output_path, 'wb') as f:
+        f.write(tflite_model)
+    
+    logger.info(f"Saved int8 TFLite model to {output_path}")
+    return output_path
+
+def get_input_buffer():
+    """
+    Get the calling thread's reusable float32 input batch of size one.
+    
+    Returns:
+        A numpy array of shape (1,) + INPUT_SHAPE
+    """
+    buffer = getattr(_input_local, 'buffer', None)
+    if buffer is None:
+        buffer = np.empty((1,) + INPUT_SHAPE, dtype=np.float32)
+        _input_local.buffer = buffer
+    return buffer
+
+def preprocess_image(image_path, target_size=(150, 150), out=None):
     """
     Preprocess an image for prediction.
     
     Args:
         image_path: Path to the image file
         target_size: Tuple of (height, width) to resize the image to
+        out: Float32 array of shape (1, height, width, 3) to write the result
+             into instead of allocating a new one (optional)
         
     Returns:
         A preprocessed image as a numpy array
     """
     try:
-        # Load and preprocess the image
-        img = Image.open(image_path)
-        img = img.resize(target_size)
-        img = img.convert('RGB')  # Ensure it's RGB (for grayscale images)
+        img = None
+        if opencv_available:
+            # Load as 3-channel BGR (grayscale images are expanded); returns
+            # None for formats OpenCV cannot decode, such as GIF
+            img = cv2.imread(image_path, cv2.IMREAD_COLOR)
         
-        # Convert to numpy array and normalize
-        img_array = np.array(img) / 255.0
+        if img is not None:
+            # Convert to the RGB order the model was trained on
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+            img = cv2.resize(img, (target_size[1], target_size[0]), interpolation=cv2.INTER_AREA)
+        else:
+            img = Image.open(image_path)
+            img = img.resize((target_size[1], target_size[0]))
+            img = np.asarray(img.convert('RGB'))  # Ensure it's RGB (for grayscale images)
         
-        # Add batch dimension
-        img_array = np.expand_dims(img_array, axis=0)
+        # Convert to float32 with a batch dimension and normalize in place,
+        # avoiding a float64 copy
+        if out is None:
+            out = np.empty((1,) + img.shape, dtype=np.float32)
+        out[0] = img
+        out *= np.float32(1.0 / 255.0)
         
-        return img_array
+        return out
     
     except Exception as e:
         logger.error(f"Error preprocessing image: {e}")
@@ -103,37 +478,36 @@ def predict_tumor_type(model, image_path):
     Predict the tumor type from an MRI image.
     
     Args:
-        model: The loaded TensorFlow/Keras model
+        model: The loaded model, or any object exposing predict()
         image_path: Path to the MRI image file
         
     Returns:
         A dictionary containing the prediction results
     """
     try:
-        # Class labels
-        class_labels = ['glioma', 'meningioma', 'notumor', 'pituitary']
-        
-        # Preprocess the image
-        preprocessed_image = preprocess_image(image_path)
+        # Preprocess the image into this thread's reusable input batch
+        preprocessed_image = preprocess_image(image_path, out=get_input_buffer())
         
         # Make prediction
         predictions = model.predict(preprocessed_image)
+        preds = predictions[0]
         
         # Get the predicted class and confidence
-        predicted_class_idx = np.argmax(predictions[0])
-        predicted_class = class_labels[predicted_class_idx]
-        confidence = float(predictions[0][predicted_class_idx])
+        predicted_class_idx = int(preds.argmax())
+        predicted_class = CLASS_LABELS[predicted_class_idx]
+        confidence = float(preds[predicted_class_idx])
         
         # Get confidence scores for all classes
-        class_confidences = {class_labels[i]: float(predictions[0][i]) for i in range(len(class_labels))}
+        raw_predictions = preds.tolist()
+        class_confidences = dict(zip(CLASS_LABELS, raw_predictions))
         
         # Return the prediction results
         return {
             'predicted_class': predicted_class,
             'confidence': confidence,
             'class_confidences': class_confidences,
-            'raw_predictions': [float(p) for p in predictions[0]],
-            'class_labels': class_labels
+            'raw_predictions': raw_predictions,
+            'class_labels': list(CLASS_LABELS)
         }
     
     except Exception as e:
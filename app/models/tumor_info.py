@@ -2,9 +2,14 @@
 Tumor Information Module
 -----------------------
 This module provides functions to retrieve information about different types of brain tumors.
+
+TUMOR_INFO and its per-type entries are read-only mappings, so they cannot
+be modified by callers but are also not JSON-serializable or picklable.
+Use get_tumor_info, which returns a plain dictionary, for serialization.
 """
 
 import logging
+import types
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -119,6 +124,33 @@ TUMOR_INFO = {
     }
 }
 
+# Store list fields as tuples and expose the table and its entries
+# read-only, so callers cannot modify the shared data
+for _info in TUMOR_INFO.values():
+    for _field in ('common_symptoms', 'diagnosis_methods', 'treatment_options'):
+        _info[_field] = tuple(_info[_field])
+del _info, _field
+
+TUMOR_INFO = types.MappingProxyType({key: types.MappingProxyType(info) for key, info in TUMOR_INFO.items()})
+
+# Tumor type keys, in definition order
+TUMOR_TYPES = tuple(TUMOR_INFO)
+
+# Map tumor type names and name fragments to TUMOR_INFO keys. Exact names
+# are looked up directly; otherwise the first alias (in this order) that
+# occurs in the name wins, so the more specific fragments come first.
+TUMOR_ALIASES = {
+    'glioma': 'glioma',
+    'meningioma': 'meningioma',
+    'mening': 'meningioma',
+    'pituitary': 'pituitary',
+    'pituit': 'pituitary',
+    'notumor': 'notumor',
+    'no': 'notumor',
+    'healthy': 'notumor',
+    'normal': 'notumor'
+}
+
 def get_tumor_info(tumor_type):
     """
     Get information about a specific tumor type.
@@ -127,25 +159,20 @@ def get_tumor_info(tumor_type):
         tumor_type: The type of tumor (glioma, meningioma, pituitary, or notumor)
         
     Returns:
-        A dictionary containing information about the tumor type, or None if not found
+        A new, JSON-serializable dictionary containing information about the
+        tumor type, or None if not found
     """
     try:
         # Normalize tumor type to lowercase and handle variations
         tumor_type = tumor_type.lower()
         
-        # Direct lookup
-        if tumor_type in TUMOR_INFO:
-            return TUMOR_INFO[tumor_type]
+        key = TUMOR_ALIASES.get(tumor_type)
+        if key is None:
+            key = next((value for alias, value in TUMOR_ALIASES.items() if alias in tumor_type), None)
         
-        # Handle variations in naming
-        if 'glioma' in tumor_type:
-            return TUMOR_INFO['glioma']
-        elif 'mening' in tumor_type:
-            return TUMOR_INFO['meningioma']
-        elif 'pituit' in tumor_type:
-            return TUMOR_INFO['pituitary']
-        elif 'no' in tumor_type or 'not' in tumor_type or 'healthy' in tumor_type:
-            return TUMOR_INFO['notumor']
+        if key is not None:
+            # Copy the read-only entry; its values are immutable strings and tuples
+            return dict(TUMOR_INFO[key])
         
         # If no match found
         logger.warning(f"No tumor info found for type: {tumor_type}")
@@ -157,9 +184,9 @@ def get_tumor_info(tumor_type):
 
 def get_all_tumor_types():
     """
-    Get a list of all available tumor types.
+    Get all available tumor types.
     
     Returns:
-        A list of tumor type keys
+        A tuple of tumor type keys
     """
-    return list(TUMOR_INFO.keys()) 
\ No newline at end of file
+    return TUMOR_TYPES 
\ No newline at end of file
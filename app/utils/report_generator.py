@@ -7,7 +7,13 @@ This module provides functions to generate PDF reports for patient scans.
 import os
 import io
 import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections.abc import Mapping
 from datetime import datetime
+from functools import lru_cache
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -19,180 +25,327 @@ try:
     from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle
     from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
     from reportlab.lib.units import inch
+    from PIL import Image as PILImage
     reportlab_available = True
+    
+    # Paragraph and table styles shared by all reports
+    _STYLES = getSampleStyleSheet()
+    _STYLES.add(ParagraphStyle(name='CenterTitle', 
+                               parent=_STYLES['Heading1'], 
+                               alignment=1,
+                               spaceAfter=12))
+    _STYLES.add(ParagraphStyle(name='SectionHeader', 
+                               parent=_STYLES['Heading2'], 
+                               fontSize=14, 
+                               spaceAfter=6))
+    _STYLES.add(ParagraphStyle(name='SubsectionHeader', 
+                               parent=_STYLES['Heading3'], 
+                               fontSize=12, 
+                               spaceAfter=6))
+    
+    _TABLE_STYLE = TableStyle([
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('PADDING', (0, 0), (-1, -1), 6)
+    ])
 except ImportError:
     logger.warning("ReportLab not installed. PDF reports will not be available.")
     reportlab_available = False
 
+# Number of rendered reports kept in memory
+REPORT_CACHE_SIZE = 256
+
+# Maximum pixel size of the embedded scan image (its 5x4 inch slot at 100 dpi)
+REPORT_IMAGE_SIZE = (500, 400)
+
+# Maximum worker processes rendering reports. This applies per web server
+# process, so it is kept small rather than scaled to the CPU count.
+REPORT_WORKERS = min(4, os.cpu_count() or 1)
+
+# Worker processes that render reports off the request thread, started on first use
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
 def generate_scan_report(patient, scan, tumor_info=None):
     """
     Generate a PDF report for a patient's scan.
     
+    Rendered reports are cached, keyed by the patient, scan and tumor
+    details, the scan image's modification time and the report date, so
+    repeated downloads of an unchanged report skip rendering.
+    
     Args:
         patient: Dictionary containing patient information
         scan: Dictionary containing scan information
         tumor_info: Dictionary containing tumor information (optional)
         
     Returns:
-        PDF data as bytes, or None if generation fails
+        A binary file-like object positioned at the start of the PDF data
+        (suitable for Flask's send_file), or None if generation fails
     """
     if not reportlab_available:
         logger.error("ReportLab library not available. Cannot generate PDF report.")
         return None
     
     try:
-        # Create a file-like buffer for the PDF
-        buffer = io.BytesIO()
+        image_path = scan.get('image_path', '')
+        image_mtime = os.path.getmtime(image_path) if image_path and os.path.exists(image_path) else None
+        report_date = datetime.now().strftime("%B %d, %Y")
         
-        # Create the PDF document
-        doc = SimpleDocTemplate(buffer, pagesize=letter,
-                               rightMargin=72, leftMargin=72,
-                               topMargin=72, bottomMargin=72)
+        pdf_data = _render_cached_report(_freeze(patient), _freeze(scan), _freeze(tumor_info or {}),
+                                         image_mtime, report_date)
         
-        # Create the list of elements to build the PDF
-        elements = []
+        # BytesIO shares the cached bytes rather than copying them; each
+        # caller gets its own read position
+        return io.BytesIO(pdf_data)
+    
+    except Exception as e:
+        logger.error(f"Error generating PDF report: {e}")
+        return None
+
+def _freeze(value):
+    """
+    Convert a mapping (with list or mapping values) into a hashable cache key.
+    
+    Args:
+        value: The value to convert
         
-        # Get styles
-        styles = getSampleStyleSheet()
-        styles.add(ParagraphStyle(name='CenterTitle', 
-                                  parent=styles['Heading1'], 
-                                  alignment=1,
-                                  spaceAfter=12))
-        styles.add(ParagraphStyle(name='SectionHeader', 
-                                  parent=styles['Heading2'], 
-                                  fontSize=14, 
-                                  spaceAfter=6))
-        styles.add(ParagraphStyle(name='SubsectionHeader', 
-                                  parent=styles['Heading3'], 
-                                  fontSize=12, 
-                                  spaceAfter=6))
+    Returns:
+        A hashable equivalent of the value
+    """
+    if isinstance(value, Mapping):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+@lru_cache(maxsize=REPORT_CACHE_SIZE)
+def _render_cached_report(patient_key, scan_key, tumor_key, image_mtime, report_date):
+    """
+    Render a report from frozen cache keys; see generate_scan_report.
+    
+    image_mtime is not used for rendering; it is part of the cache key so
+    that replacing the scan image produces a new report.
+    """
+    args = (dict(patient_key), dict(scan_key), dict(tumor_key) or None, report_date)
+    
+    pool = _get_render_pool()
+    try:
+        future = pool.submit(_render_report, *args)
+    except (BrokenProcessPool, OSError, RuntimeError) as e:
+        # Worker processes could not be started, or another thread shut
+        # this pool down after it was fetched; render in-process
+        logger.warning(f"Report worker pool unavailable, rendering in-process: {e}")
+        _reset_render_pool(pool)
+        return _render_report(*args)
+    
+    # Errors raised while rendering propagate to the caller unchanged; only
+    # a pool that broke while running the task is discarded
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        _reset_render_pool(pool)
+        raise
+
+def _get_render_pool():
+    """
+    Get the process pool used to render reports, creating it if needed.
+    
+    ReportLab rendering is CPU-bound, so separate processes let several
+    reports render in parallel outside this process's GIL. The requesting
+    thread still waits for its report to finish. Workers
+    are started from a clean server process ('forkserver', or 'spawn'
+    where unavailable) rather than forked from the web process, which may
+    hold threads and open SQLite connections.
+    
+    Returns:
+        A ProcessPoolExecutor
+    """
+    global _render_pool
+    
+    with _render_pool_lock:
+        if _render_pool is None:
+            start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _render_pool = ProcessPoolExecutor(max_workers=REPORT_WORKERS,
+                                               mp_context=multiprocessing.get_context(start_method))
+        return _render_pool
+
+def _reset_render_pool(pool):
+    """
+    Discard a broken report process pool so the next report starts a new one.
+    
+    Args:
+        pool: The pool that failed; nothing is done if another thread has
+              already replaced it
+    """
+    global _render_pool
+    
+    with _render_pool_lock:
+        if _render_pool is pool:
+            _render_pool = None
+    
+    pool.shutdown(wait=False)
+
+def _load_report_image(image_path):
+    """
+    Downscale a scan image to the size it is drawn at in the report.
+    
+    Embedding the full-resolution source would bloat the PDF with pixels
+    that are never displayed.
+    
+    Args:
+        image_path: Path to the scan image
         
-        # Add title
-        elements.append(Paragraph("Brain Tumor Analysis Report", styles['CenterTitle']))
-        elements.append(Spacer(1, 0.2*inch))
+    Returns:
+        A JPEG-encoded image in a BytesIO buffer
+    """
+    with PILImage.open(image_path) as im:
+        im.thumbnail(REPORT_IMAGE_SIZE, PILImage.LANCZOS)
+        if im.mode not in ('RGB', 'L'):
+            im = im.convert('RGB')
         
-        # Add report date
-        report_date = datetime.now().strftime("%B %d, %Y")
-        elements.append(Paragraph(f"Report Date: {report_date}", styles['Normal']))
-        elements.append(Spacer(1, 0.2*inch))
+        buffer = io.BytesIO()
+        im.save(buffer, 'JPEG', quality=85, optimize=True)
+    
+    buffer.seek(0)
+    return buffer
+
+def _render_report(patient, scan, tumor_info, report_date):
+    """
+    Build the PDF document for a patient's scan.
+    
+    Args:
+        patient: Dictionary containing patient information
+        scan: Dictionary containing scan information
+        tumor_info: Dictionary containing tumor information, or None
+        report_date: Date string printed on the report
         
-        # Patient Information section
-        elements.append(Paragraph("Patient Information", styles['SectionHeader']))
-        patient_data = [
-            ["Patient Name:", patient.get('name', 'N/A')],
-            ["Patient ID:", str(patient.get('id', 'N/A'))],
-            ["Age:", str(patient.get('age', 'N/A'))],
-            ["Gender:", patient.get('gender', 'N/A')],
-            ["Contact:", patient.get('contact', 'N/A')],
-            ["Registration Date:", patient.get('registration_date', 'N/A')]
-        ]
-        patient_table = Table(patient_data, colWidths=[2*inch, 3*inch])
-        patient_table.setStyle(TableStyle([
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('PADDING', (0, 0), (-1, -1), 6)
-        ]))
-        elements.append(patient_table)
+    Returns:
+        PDF data as bytes
+    """
+    # Create a file-like buffer for the PDF
+    buffer = io.BytesIO()
+    
+    # Create the PDF document
+    doc = SimpleDocTemplate(buffer, pagesize=letter,
+                           rightMargin=72, leftMargin=72,
+                           topMargin=72, bottomMargin=72)
+    
+    # Create the list of elements to build the PDF
+    elements = []
+    
+    # Get styles
+    styles = _STYLES
+    
+    # Add title
+    elements.append(Paragraph("Brain Tumor Analysis Report", styles['CenterTitle']))
+    elements.append(Spacer(1, 0.2*inch))
+    
+    # Add report date
+    elements.append(Paragraph(f"Report Date: {report_date}", styles['Normal']))
+    elements.append(Spacer(1, 0.2*inch))
+    
+    # Patient Information section
+    elements.append(Paragraph("Patient Information", styles['SectionHeader']))
+    patient_data = [
+        ["Patient Name:", patient.get('name', 'N/A')],
+        ["Patient ID:", str(patient.get('id', 'N/A'))],
+        ["Age:", str(patient.get('age', 'N/A'))],
+        ["Gender:", patient.get('gender', 'N/A')],
+        ["Contact:", patient.get('contact', 'N/A')],
+        ["Registration Date:", patient.get('registration_date', 'N/A')]
+    ]
+    patient_table = Table(patient_data, colWidths=[2*inch, 3*inch])
+    patient_table.setStyle(_TABLE_STYLE)
+    elements.append(patient_table)
+    elements.append(Spacer(1, 0.2*inch))
+    
+    # Add medical history if available
+    if patient.get('medical_history'):
+        elements.append(Paragraph("Medical History:", styles['SubsectionHeader']))
+        elements.append(Paragraph(patient.get('medical_history', 'None'), styles['Normal']))
         elements.append(Spacer(1, 0.2*inch))
-        
-        # Add medical history if available
-        if patient.get('medical_history'):
-            elements.append(Paragraph("Medical History:", styles['SubsectionHeader']))
-            elements.append(Paragraph(patient.get('medical_history', 'None'), styles['Normal']))
+    
+    # Scan Information section
+    elements.append(Paragraph("Scan Information", styles['SectionHeader']))
+    scan_data = [
+        ["Scan ID:", str(scan.get('id', 'N/A'))],
+        ["Scan Date:", scan.get('scan_date', 'N/A')],
+        ["Detected Tumor Type:", scan.get('tumor_type', 'N/A')],
+        ["Confidence:", f"{scan.get('confidence', 0):.2%}" if scan.get('confidence') is not None else 'N/A']
+    ]
+    scan_table = Table(scan_data, colWidths=[2*inch, 3*inch])
+    scan_table.setStyle(_TABLE_STYLE)
+    elements.append(scan_table)
+    elements.append(Spacer(1, 0.2*inch))
+    
+    # Add scan image if available
+    image_path = scan.get('image_path', '')
+    if image_path and os.path.exists(image_path):
+        try:
+            elements.append(Paragraph("MRI Scan Image:", styles['SubsectionHeader']))
+            
+            # Add the image, downscaled and scaled to fit the page width
+            img = Image(_load_report_image(image_path), width=5*inch, height=4*inch)
+            elements.append(img)
             elements.append(Spacer(1, 0.2*inch))
-        
-        # Scan Information section
-        elements.append(Paragraph("Scan Information", styles['SectionHeader']))
-        scan_data = [
-            ["Scan ID:", str(scan.get('id', 'N/A'))],
-            ["Scan Date:", scan.get('scan_date', 'N/A')],
-            ["Detected Tumor Type:", scan.get('tumor_type', 'N/A')],
-            ["Confidence:", f"{scan.get('confidence', 0):.2%}" if scan.get('confidence') is not None else 'N/A']
-        ]
-        scan_table = Table(scan_data, colWidths=[2*inch, 3*inch])
-        scan_table.setStyle(TableStyle([
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('PADDING', (0, 0), (-1, -1), 6)
-        ]))
-        elements.append(scan_table)
+        except Exception as e:
+            logger.error(f"Error adding image to report: {e}")
+    
+    # Add doctor's notes if available
+    if scan.get('doctor_notes'):
+        elements.append(Paragraph("Doctor's Notes:", styles['SubsectionHeader']))
+        elements.append(Paragraph(scan.get('doctor_notes', 'None'), styles['Normal']))
         elements.append(Spacer(1, 0.2*inch))
+    
+    # Add tumor information if available
+    if tumor_info:
+        elements.append(Paragraph("Tumor Information", styles['SectionHeader']))
         
-        # Add scan image if available
-        image_path = scan.get('image_path', '')
-        if image_path and os.path.exists(image_path):
-            try:
-                elements.append(Paragraph("MRI Scan Image:", styles['SubsectionHeader']))
-                
-                # Add the image, scaled to fit the page width
-                img = Image(image_path, width=5*inch, height=4*inch)
-                elements.append(img)
-                elements.append(Spacer(1, 0.2*inch))
-            except Exception as e:
-                logger.error(f"Error adding image to report: {e}")
+        # Add tumor description
+        elements.append(Paragraph("Description:", styles['SubsectionHeader']))
+        elements.append(Paragraph(tumor_info.get('description', 'N/A'), styles['Normal']))
+        elements.append(Spacer(1, 0.1*inch))
         
-        # Add doctor's notes if available
-        if scan.get('doctor_notes'):
-            elements.append(Paragraph("Doctor's Notes:", styles['SubsectionHeader']))
-            elements.append(Paragraph(scan.get('doctor_notes', 'None'), styles['Normal']))
-            elements.append(Spacer(1, 0.2*inch))
+        # Add origin information
+        elements.append(Paragraph("Origin:", styles['SubsectionHeader']))
+        elements.append(Paragraph(tumor_info.get('origin', 'N/A'), styles['Normal']))
+        elements.append(Spacer(1, 0.1*inch))
         
-        # Add tumor information if available
-        if tumor_info:
-            elements.append(Paragraph("Tumor Information", styles['SectionHeader']))
-            
-            # Add tumor description
-            elements.append(Paragraph("Description:", styles['SubsectionHeader']))
-            elements.append(Paragraph(tumor_info.get('description', 'N/A'), styles['Normal']))
-            elements.append(Spacer(1, 0.1*inch))
-            
-            # Add origin information
-            elements.append(Paragraph("Origin:", styles['SubsectionHeader']))
-            elements.append(Paragraph(tumor_info.get('origin', 'N/A'), styles['Normal']))
-            elements.append(Spacer(1, 0.1*inch))
-            
-            # Add common symptoms
-            elements.append(Paragraph("Common Symptoms:", styles['SubsectionHeader']))
-            symptoms = tumor_info.get('common_symptoms', [])
-            if symptoms:
-                symptom_text = "<br/>• ".join([''] + symptoms)
-                elements.append(Paragraph(f"• {symptom_text}", styles['Normal']))
-            else:
-                elements.append(Paragraph("No information available", styles['Normal']))
-            elements.append(Spacer(1, 0.1*inch))
-            
-            # Add treatment options
-            elements.append(Paragraph("Treatment Options:", styles['SubsectionHeader']))
-            treatments = tumor_info.get('treatment_options', [])
-            if treatments:
-                treatment_text = "<br/>• ".join([''] + treatments)
-                elements.append(Paragraph(f"• {treatment_text}", styles['Normal']))
-            else:
-                elements.append(Paragraph("No information available", styles['Normal']))
-            elements.append(Spacer(1, 0.1*inch))
-            
-            # Add prognosis information
-            if tumor_info.get('prognosis'):
-                elements.append(Paragraph("Prognosis:", styles['SubsectionHeader']))
-                elements.append(Paragraph(tumor_info.get('prognosis', 'N/A'), styles['Normal']))
-                elements.append(Spacer(1, 0.1*inch))
-        
-        # Add disclaimer
-        elements.append(Spacer(1, 0.3*inch))
-        disclaimer = """<i>Disclaimer: This report is generated based on machine learning analysis and should be reviewed by a qualified medical professional. The information provided is not a substitute for professional medical advice, diagnosis, or treatment.</i>"""
-        elements.append(Paragraph(disclaimer, styles['Normal']))
-        
-        # Build the PDF
-        doc.build(elements)
+        # Add common symptoms
+        elements.append(Paragraph("Common Symptoms:", styles['SubsectionHeader']))
+        symptoms = tumor_info.get('common_symptoms', [])
+        if symptoms:
+            symptom_text = "<br/>• ".join(['', *symptoms])
+            elements.append(Paragraph(f"• {symptom_text}", styles['Normal']))
+        else:
+            elements.append(Paragraph("No information available", styles['Normal']))
+        elements.append(Spacer(1, 0.1*inch))
         
-        # Get the PDF data
-        pdf_data = buffer.getvalue()
-        buffer.close()
+        # Add treatment options
+        elements.append(Paragraph("Treatment Options:", styles['SubsectionHeader']))
+        treatments = tumor_info.get('treatment_options', [])
+        if treatments:
+            treatment_text = "<br/>• ".join(['', *treatments])
+            elements.append(Paragraph(f"• {treatment_text}", styles['Normal']))
+        else:
+            elements.append(Paragraph("No information available", styles['Normal']))
+        elements.append(Spacer(1, 0.1*inch))
         
-        return pdf_data
+        # Add prognosis information
+        if tumor_info.get('prognosis'):
+            elements.append(Paragraph("Prognosis:", styles['SubsectionHeader']))
+            elements.append(Paragraph(tumor_info.get('prognosis', 'N/A'), styles['Normal']))
+            elements.append(Spacer(1, 0.1*inch))
     
-    except Exception as e:
-        logger.error(f"Error generating PDF report: {e}")
-        return None 
\ No newline at end of file
+    # Add disclaimer
+    elements.append(Spacer(1, 0.3*inch))
+    disclaimer = """<i>Disclaimer: This report is generated based on machine learning analysis and should be reviewed by a qualified medical professional. The information provided is not a substitute for professional medical advice, diagnosis, or treatment.</i>"""
+    elements.append(Paragraph(disclaimer, styles['Normal']))
+    
+    # Build the PDF
+    doc.build(elements)
+    
+    # Get the PDF data; the cache keeps this single immutable copy
+    return buffer.getvalue() 
\ No newline at end of file